@@ -2,25 +2,63 @@
 """
 Utility for adding and updating copyright notices on files.
 """
-import argparse
-import collections
+import contextlib
 import fnmatch
-import glob
+import functools
+import itertools
 import os
 from pathlib import Path
-import itertools
 import re
-import string
+import stat
 import subprocess as sub
 import sys
+import threading
+import time
 import typing as ty
 
+# Modules only needed by some operations are imported where used, to
+# keep startup fast for small runs, `--help`, and library use.
 
-YEAR_PATTERN = '[0-9]{4}( *-? *[0-9]{4})?'
+
+YEAR_PATTERN = '(?P<start>[0-9]{4})(?: *-? *(?P<end>[0-9]{4}))?'
 COPYRIGHT_REGEX = 'Copyright .*'
 
+# Number of bytes read at a time from the start of a file when finding
+# a notice. More is read only while within an unterminated comment block,
+# up to MAX_HEAD_READ_SIZE.
+HEAD_READ_SIZE = 4096
+MAX_HEAD_READ_SIZE = 65536
+# Size of chunks in which the remainder of a file is copied.
+COPY_BUFFER_SIZE = 65536
+# Number of files whose heads are read per io_uring submission.
+URING_BATCH_SIZE = 256
+# Size in bytes above which files found while searching dirs are assumed
+# to be generated or vendored, and are skipped.
+MAX_FILE_SIZE = 1 << 20
+# Min and max number of existing headers sampled to find auto_header.
+AUTO_HEADER_MIN_SAMPLES = 10
+AUTO_HEADER_MAX_SAMPLES = 100
+# Number of threads used to check files.
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Flags used when reading the start of a file.
+_READ_FLAGS = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+_O_NOATIME = getattr(os, 'O_NOATIME', 0)
+
+# Patterns used for every file are compiled once, at import.
+_YEAR_RE = re.compile(YEAR_PATTERN)
+_DEFAULT_COPYRIGHT_RE = re.compile(COPYRIGHT_REGEX)
+# Equivalent of the default pattern for undecoded file content, in which
+# newlines have not been translated.
+_DEFAULT_COPYRIGHT_BYTES_RE = re.compile(rb'Copyright [^\r\n]*')
+
+# Number of commits above which a repo without a commit-graph is
+# considered slow enough to suggest writing one.
+COMMIT_GRAPH_HINT_THRESHOLD = 1000
+
 
 PathLike = ty.Union[str, os.PathLike, Path]
+T = ty.TypeVar('T')
 
 
 class Copywriter:
@@ -38,6 +76,7 @@ class Copywriter:
             copyright_re: str = COPYRIGHT_REGEX,
             filter_re: str = '',
             fmt: str = '',
+            cache_path: ty.Optional[PathLike] = None,
     ) -> None:
         """
         Create new copywriter instance.
@@ -48,19 +87,46 @@ class Copywriter:
         :param root: Paths of files or directories to search for
                     outdated or missing headers.
         :param header: Header str. (Ex: 'Copyright {years} ')
+        :param cache_path: Path of HeaderCache file in which found
+                    copyright strings are kept between runs. If not
+                    passed, no cache is used.
         """
         self.roots = [Path(path) for path in root]
         self.copyright_re = copyright_re
+        self._copyright_pat = _compile_copyright_re(copyright_re)
         self.filter_re = filter_re
 
-        self.files = self._find_files(*self.roots)
-        self._outdated: ty.Optional[ty.Set[Path]] = None
-        self._missing: ty.Optional[ty.Set[Path]] = None
+        # Git is queried in the background; the git log in particular
+        # runs while found files are checked.
+        self._ls_files: ty.Dict[Path, GitCommand] = {}
+        self._log: ty.Dict[Path, GitCommand] = {}
+        self._listings: ty.Dict[
+            Path, ty.Tuple[ty.List[str], ty.List[str]]
+        ] = {}
+        self._top_levels: ty.Dict[str, ty.Optional[Path]] = {}
+        self._repo_roots: ty.Dict[Path, ty.List[Path]] = {}
+        self._query_git(*self.roots)
+
+        # Found files are kept as strs, and only converted to Paths
+        # when returned to the caller.
+        self._files = self._find_tracked_files()
+        self._file_paths: ty.Optional[ty.Set[Path]] = None
+        self._mod_years: ty.Optional[ty.Dict[str, int]] = None
+        self._mod_years_lock = threading.Lock()
+        self._heads: ty.Optional[ty.Dict[str, bytes]] = None
+        self._txt_cache: ty.Dict[str, TxtFile] = {}
+        self._cache = (
+            HeaderCache(cache_path, self._copyright_pat.pattern)
+            if cache_path else None
+        )
+        self._cached_strs: ty.Optional[ty.Dict[str, str]] = None
+        self._outdated: ty.Optional[ty.Set[str]] = None
+        self._missing: ty.Optional[ty.Set[str]] = None
         self._passed_fmt = fmt
         self._auto_format = ''
 
     @staticmethod
-    def _find_files(*root: PathLike) -> ty.Set[Path]:
+    def _find_files(*root: Path) -> ty.Set[str]:
         """
         Finds files of recognized types.
 
@@ -71,29 +137,478 @@ class Copywriter:
         file, in which case the file will be returned if it
         is recognized.
 
+        Dirs within another passed dir are not walked again, so each
+        dir is only listed once.
+
         :param root: Paths at which to begin search.
-        :return: List[Path]
+        :return: Set[str]
         """
-        patterns = list(itertools.chain(
-            *(t.patterns for t in file_types.values())
-        ))
-        paths = {path for path in root if path.is_file() and recognize(path)}
-        for root_ in filter(Path.is_dir, root):
-            for f_pat in patterns:
-                paths |= {
-                    Path(s) for s in
-                    glob.glob(f'{root_}/**/{f_pat}', recursive=True)
-                }
+        paths = {
+            str(path) for path in root if path.is_file() and recognize(path)
+        }
+        for path in Copywriter._outer_dirs(*root).values():
+            paths.update(Copywriter._discover(path))
+        return paths
+
+    @staticmethod
+    def _outer_dirs(*root: Path) -> ty.Dict[str, str]:
+        """
+        Gets the passed roots which are dirs not within another passed
+        dir, so that overlapping roots are only searched once.
+        :param root: Paths at which to begin search.
+        :return: Dict[str, str] mapping resolved paths of dirs to their
+                    paths as passed.
+        """
+        dirs = {os.path.realpath(path): str(path) for path in root}
+        outer: ty.Dict[str, str] = {}
+        for real_path in sorted(dirs, key=len):
+            # Paths are compared by prefix rather than by commonpath,
+            # which raises for paths on different Windows drives.
+            if os.path.isdir(real_path) and not any(
+                    real_path.startswith(os.path.join(outer_path, ''))
+                    for outer_path in outer
+            ):
+                outer[real_path] = dirs[real_path]
+        return outer
+
+    def _find_tracked_files(self) -> ty.Set[str]:
+        """
+        Finds files of recognized type which are tracked by git.
+
+        Within the repos containing the roots, files are found in the
+        output of the repo's `git ls-files` rather than by searching
+        the filesystem, so that untracked dirs, such as build output,
+        are never walked. Nested repos and submodules listed by
+        `git ls-files` are listed in the same way, so that each file is
+        checked against the repo containing it.
+
+        Roots outside any repo are searched with _find_files, and found
+        files within repos have those repos queried as well.
+
+        :return: Set[str]
+        """
+        paths: ty.Set[str] = set()
+        repo_roots = list(self._repo_roots.items())
+        while repo_roots:
+            top_level, roots = repo_roots.pop()
+            names, nested = self._listing(top_level)
+            for real_path, path in self._outer_dirs(*roots).items():
+                prefix = os.path.relpath(real_path, top_level)
+                paths.update(self._list_tracked(path, prefix, names))
+                for repo in self._list_paths(path, prefix, nested):
+                    nested_top_level = Path(os.path.realpath(repo))
+                    if nested_top_level not in self._ls_files:
+                        self._query_repo(nested_top_level)
+                    repo_roots.append((nested_top_level, [Path(repo)]))
+            files = [root for root in roots if root.is_file()]
+            if files:
+                tracked = {os.path.normpath(name) for name in names}
+                paths.update(
+                    str(path) for path in files if recognize(path) and
+                    os.path.relpath(path.resolve(), top_level) in tracked
+                )
+
+        in_repo = set(itertools.chain(*self._repo_roots.values()))
+        other_roots = [root for root in self.roots if root not in in_repo]
+        found = self._find_files(*other_roots) if other_roots else set()
+        for dir_ in {os.path.dirname(path) for path in found}:
+            top_level = self._repo_top_level(dir_)
+            if top_level is not None and top_level not in self._ls_files:
+                self._query_repo(top_level)
+        tracked = self._tracked_files() if found else set()
+        paths.update(
+            path for path in found if os.path.realpath(path) in tracked
+        )
+        # Paths are normalized, as by Path, so that a file found from
+        # more than one root (Ex: './a.py' and 'a.py') is kept once.
+        return {os.path.normpath(path) for path in paths}
+
+    @staticmethod
+    def _list_paths(
+            root: str, prefix: str, names: ty.Iterable[str]
+    ) -> ty.Iterator[str]:
+        """
+        Yields the paths of listed entries within a dir. Hidden files
+        and dirs are skipped, as by _discover.
+        :param root: Path of dir, as passed.
+        :param prefix: Path of dir relative to the repo's top level.
+        :param names: Paths of entries relative to the repo's top
+                    level, as listed by `git ls-files`.
+        :return: Iterator[str] of paths.
+        """
+        prefix = '' if prefix == '.' else prefix.replace(os.sep, '/') + '/'
+        for name in names:
+            if not name.startswith(prefix):
+                continue
+            relative_path = name[len(prefix):]
+            if relative_path.startswith('.') or '/.' in relative_path:
+                continue
+            yield os.path.join(root, os.path.normpath(relative_path))
+
+    @staticmethod
+    def _list_tracked(
+            root: str, prefix: str, names: ty.Iterable[str]
+    ) -> ty.Iterator[str]:
+        """
+        Yields tracked files of recognized type within a dir.
+
+        Files are filtered as by _discover: hidden files and dirs,
+        symlinks, and files larger than MAX_FILE_SIZE are skipped, as
+        are tracked files which have since been deleted.
+
+        :param root: Path of dir, as passed.
+        :param prefix: Path of dir relative to the repo's top level.
+        :param names: Paths of tracked files relative to the repo's top
+                    level, as listed by `git ls-files`.
+        :return: Iterator[str] of file paths.
+        """
+        for path in Copywriter._list_paths(root, prefix, names):
+            if not _recognize_by_name(os.path.basename(path)):
+                continue
+            try:
+                file_stat = os.lstat(path)
+            except OSError:
+                continue
+            if (
+                    stat.S_ISREG(file_stat.st_mode) and
+                    file_stat.st_size <= MAX_FILE_SIZE
+            ):
+                yield path
+
+    def _repo_top_level(self, dir_: str) -> ty.Optional[Path]:
+        """
+        Finds the top level dir of the innermost repo containing a dir,
+        by checking the dir and its parents for a `.git` entry.
+
+        Results are kept for every checked dir, so that each dir is
+        only checked once.
+        :param dir_: Path of dir.
+        :return: Path of repo's top level dir, or None if not in a repo.
+        """
+        dir_ = os.path.realpath(dir_ or '.')
+        checked: ty.List[str] = []
+        while dir_ not in self._top_levels:
+            checked.append(dir_)
+            if os.path.lexists(os.path.join(dir_, '.git')):
+                self._top_levels[dir_] = Path(dir_)
+                break
+            parent = os.path.dirname(dir_)
+            if parent == dir_:
+                self._top_levels[dir_] = None
+                break
+            dir_ = parent
+        top_level = self._top_levels[dir_]
+        self._top_levels.update(dict.fromkeys(checked, top_level))
+        return top_level
+
+    @staticmethod
+    def _discover(root: str) -> ty.Iterator[str]:
+        """
+        Yields files of recognized type within a dir tree.
+
+        The tree is walked once, rather than once per file pattern, and
+        entries are told apart as files or dirs using the file type info
+        returned with each dir listing by os.scandir, so unrecognized
+        files are never stat'ed.
+
+        Hidden files and dirs are skipped, as by glob, and symlinks
+        are not followed. Files larger than MAX_FILE_SIZE are skipped,
+        so they are never opened; checking the size costs one lstat
+        per recognized file on POSIX, while on Windows the size comes
+        with the dir listing.
+
+        :param root: Path of dir at which to begin search.
+        :return: Iterator[str] of file paths.
+        """
+        dirs = [root]
+        while dirs:
+            try:
+                entries = os.scandir(dirs.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif (
+                        entry.is_file(follow_symlinks=False) and
+                        _recognize_by_name(entry.name) and
+                        entry.stat(follow_symlinks=False).st_size <=
+                        MAX_FILE_SIZE
+                    ):
+                        yield entry.path
+
+    def _query_git(self, *root: Path) -> None:
+        """
+        Starts the git commands needed to find tracked files and their
+        modification years.
+
+        One `git ls-files` and one `git log` is started for each repo
+        containing the passed roots, rather than one per file. Repos are
+        found by _repo_top_level, so that no git command is run for
+        each root.
+
+        :param root: Paths at which search will begin.
+        :return: None
+        """
+        for root_ in root:
+            if not root_.exists():
+                continue
+            top_level = self._repo_top_level(
+                str(root_ if root_.is_dir() else root_.parent)
+            )
+            if top_level is not None:
+                self._repo_roots.setdefault(top_level, []).append(root_)
+
+        for top_level, roots in self._repo_roots.items():
+            self._query_repo(
+                top_level,
+                *(os.path.relpath(p.resolve(), top_level) for p in roots)
+            )
+
+    def _query_repo(self, top_level: Path, *pathspec: str) -> None:
+        """
+        Starts `git ls-files` and `git log` for a repo.
+
+        Untracked files are listed along with tracked ones, with each
+        untracked dir listed once rather than walked, so that nested
+        repos can be found without searching the filesystem.
+        :param top_level: Path of repo's top level dir.
+        :param pathspec: Paths within the repo to which the log is
+                    limited. If none are passed, the whole log is used.
+        :return: None
+        """
+        self._ls_files[top_level] = GitCommand(
+            'ls-files', '-z', '-t', '--stage', '--cached', '--others',
+            '--directory', cwd=top_level
+        )
+        # Paths are passed as literal pathspecs; git log is much
+        # slower when matching wildcards, even with a commit-graph.
+        self._log[top_level] = GitCommand(
+            '--literal-pathspecs', '-c', 'core.quotePath=false', 'log',
+            '--name-only', '--format=COMMIT:%h:%ad', '--date=format:%Y',
+            '--', *pathspec,
+            cwd=top_level
+        )
+
+    def _listing(
+            self, top_level: Path
+    ) -> ty.Tuple[ty.List[str], ty.List[str]]:
+        """
+        Gets the entries listed by a repo's `git ls-files`, parsing them
+        on first use.
+
+        Nested repos are the submodules (gitlinks) and untracked dirs
+        listed which contain a `.git` entry. Repos within otherwise
+        untracked dirs are not found, as those dirs are not walked.
+        :param top_level: Path of repo's top level dir.
+        :return: Tuple of List[str] of tracked files and List[str] of
+                    nested repos, relative to the repo's top level.
+        """
+        try:
+            return self._listings[top_level]
+        except KeyError:
+            pass
+        try:
+            output = self._ls_files[top_level].output
+        except sub.CalledProcessError:
+            output = b''  # Not a usable repo; none of its files are tracked.
+        tracked: ty.List[str] = []
+        nested: ty.List[str] = []
+        for entry in output.split(b'\0'):
+            # Untracked entries are tagged '?', and have no stage info.
+            # Tracked entries are listed as '<tag> <mode> <object>
+            # <stage>\t<name>'.
+            if entry.startswith(b'? '):
+                if entry.endswith(b'/'):
+                    nested.append(os.fsdecode(entry[2:-1]))
+                continue
+            info, _, name = entry.partition(b'\t')
+            if info.split()[1:2] == [b'160000']:  # Gitlink mode.
+                nested.append(os.fsdecode(name))
+            elif name:
+                tracked.append(os.fsdecode(name))
+        nested = [
+            name for name in nested
+            if os.path.lexists(os.path.join(top_level, name, '.git'))
+        ]
+        self._listings[top_level] = tracked, nested
+        return tracked, nested
+
+    def _tracked_files(self) -> ty.Set[str]:
+        """
+        Gets the resolved paths of all files tracked by git in the
+        searched repos.
+        :return: Set[str]
+        """
+        tracked: ty.Set[str] = set()
+        for top_level in self._ls_files:
+            tracked |= {
+                os.path.normpath(os.path.join(top_level, name))
+                for name in self._listing(top_level)[0]
+            }
+        return tracked
+
+    def _load_modification_years(self) -> ty.Dict[str, int]:
+        """
+        Gets the year in which each found file was last modified.
+
+        Rather than running `git log` once per file, the output of the
+        single `git log` run for each repo is parsed, and the files
+        listed under each commit are attributed that commit's year.
+        Output is parsed as it is read, so the log of a large repo is
+        never held in memory.
+
+        Files for which no year could be determined, including all
+        files of repos whose log failed (Ex: repos without commits), are
+        omitted from the returned dict.
+
+        :return: Dict[str, int] mapping found files to years.
+        """
+        files = {os.path.realpath(path): path for path in self._files}
+        years: ty.Dict[str, int] = {}
+        for top_level, log in self._log.items():
+            repo_years: ty.Dict[str, int] = {}
+            year = 0
+            try:
+                for line in log.lines():
+                    if line.startswith('COMMIT:'):
+                        year = int(line.rsplit(':', 1)[1])
+                    elif line:
+                        path = files.get(
+                            os.path.normpath(os.path.join(top_level, line))
+                        )
+                        if path is not None:
+                            repo_years[path] = max(
+                                repo_years.get(path, 0), year
+                            )
+            except sub.CalledProcessError:
+                continue
+            years.update(repo_years)
+        return years
+
+    def _modification_years(self) -> ty.Dict[str, int]:
+        """
+        Gets the years in which found files were last modified, loading
+        them on first use.
+
+        Years are first needed by files being checked concurrently, so
+        they are only loaded by the first caller.
+        :return: Dict[str, int] mapping found files to years.
+        """
+        with self._mod_years_lock:
+            if self._mod_years is None:
+                self._mod_years = self._load_modification_years()
+        return self._mod_years
+
+    def _modification_year(self, path: str) -> ty.Optional[int]:
+        """
+        Gets the year in which a found file was last modified, if known.
+        :param path: Path of found file.
+        :return: int or None
+        """
+        return self._modification_years().get(path)
+
+    def _cached_copyright_str(self, path: str) -> ty.Optional[str]:
+        """
+        Gets the copyright string of a found file from the HeaderCache,
+        if the file is unchanged since it was cached.
+        :param path: Path of found file.
+        :return: str or None
+        """
+        if self._cached_strs is None:
+            self._cached_strs = (
+                self._cache.load(
+                    self._files, map(str, filter(Path.is_dir, self.roots))
+                ) if self._cache else {}
+            )
+        return self._cached_strs.get(path)
+
+    def _head(self, path: str) -> ty.Optional[bytes]:
+        """
+        Gets the start of a found file's content, if already read.
+
+        Where io_uring is available, the starts of all found files which
+        are not cached are read in batches on first use. Otherwise, each
+        TxtFile reads its own file.
+        :param path: Path of found file.
+        :return: bytes or None
+        """
+        if self._heads is None:
+            self._heads = read_heads(
+                path_ for path_ in self._files
+                if self._cached_copyright_str(path_) is None
+            )
+        return self._heads.get(path)
+
+    def _txt(self, path: str) -> 'TxtFile':
+        """
+        Gets the TxtFile for a found file, creating it on first use, so
+        that each file is read at most once.
+        :param path: Path of found file.
+        :return: TxtFile
+        """
+        try:
+            return self._txt_cache[path]
+        except KeyError:
+            copyright_str = self._cached_copyright_str(path)
+            txt = TxtFile(
+                path,
+                self._copyright_pat,
+                # The year is only looked up if needed, so that files
+                # are not checked only once the whole git log is read.
+                functools.partial(self._modification_year, path),
+                self._head(path) if copyright_str is None else None,
+                copyright_str,
+            )
+            self._txt_cache[path] = txt
+            return txt
+
+    def _map_files(
+            self, func: ty.Callable[['TxtFile'], T]
+    ) -> ty.Dict[str, T]:
+        """
+        Calls a function with the TxtFile of each found file.
+
+        Checking a file is mostly spent waiting on file reads, so files
+        are checked concurrently by a pool of threads.
 
-        def is_git_tracked(path: Path) -> bool:
-            return sub.run(
-                args=('git', 'ls-files', '--error-unmatch', path.absolute()),
-                stderr=sub.DEVNULL,
-                stdout=sub.DEVNULL,
-                cwd=path.parent
-            ).returncode == 0
+        :param func: Function to call with each TxtFile.
+        :return: Dict[str, T] mapping found files to returned values.
+        """
+        from concurrent import futures
+
+        # TxtFiles are created beforehand, so that workers
+        # do not modify the cache.
+        txts = {path: self._txt(path) for path in self._files}
+        with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            return dict(zip(txts, executor.map(func, txts.values())))
 
-        return {path for path in paths if is_git_tracked(path)}
+    def _classify(self) -> None:
+        """
+        Finds files with missing or outdated copyright headers.
+
+        Both are found in a single pass over the found files, so that
+        each file is checked once. Files are only checked on the
+        first call.
+        :return: None
+        """
+        if self._outdated is not None:
+            return
+        checked = self._map_files(_check_header)
+        self._missing = {
+            path for path, (missing, _) in checked.items() if missing
+        }
+        self._outdated = {
+            path for path, (_, outdated) in checked.items() if outdated
+        }
+        if self._cache:
+            self._cache.store({
+                path: self._txt(path).copyright_str for path in self._files
+                if path not in self._cached_strs
+            })
 
     def show(self) -> None:
         """
@@ -128,8 +643,11 @@ class Copywriter:
 
         :return: List[Path] of modified files.
         """
-        for path in self.outdated:
-            TxtFile(path, self.copyright_re).update()
+        self._classify()
+        for path in self._outdated:
+            self._txt(path).update()
+        if self._cache:
+            self._cache.discard(self._outdated)
 
     def add_missing(self, header: str = '') -> None:
         """
@@ -138,24 +656,35 @@ class Copywriter:
         :param header: Copyright header format. Defaults to auto_header.
         :return: List[Path] of modified files.
         """
+        # Files are checked concurrently before any header is sampled,
+        # so that auto_header only uses already parsed headers.
+        self._classify()
         header = header or self.auto_header
-        for path in self.missing:
-            TxtFile(path, self.copyright_re).add(header)
+        for path in self._missing:
+            self._txt(path).add(header)
+        if self._cache:
+            self._cache.discard(self._missing)
 
     # Accessors
 
+    @property
+    def files(self) -> ty.Set[Path]:
+        """
+        Gets found files of recognized type which are tracked by git.
+        :return: Set[Path]
+        """
+        if self._file_paths is None:
+            self._file_paths = {Path(path) for path in self._files}
+        return self._file_paths
+
     @property
     def outdated(self) -> ty.Set[Path]:
         """
         Gets files with outdated copyright headers.
         :return: List[Path]
         """
-        if self._outdated is None:
-            self._outdated = {
-                path for path in self.files if
-                TxtFile(path, self.copyright_re).header_is_outdated
-            }
-        return self._outdated
+        self._classify()
+        return {Path(path) for path in self._outdated}
 
     @property
     def missing(self) -> ty.Set[Path]:
@@ -163,12 +692,27 @@ class Copywriter:
         Finds files with missing copyright headers.
         :return: List[Path]
         """
-        if self._missing is None:
-            self._missing = {
-                path for path in self.files
-                if not TxtFile(path, self.copyright_re).copyright_str
-            }
-        return self._missing
+        self._classify()
+        return {Path(path) for path in self._missing}
+
+    @property
+    def repos(self) -> ty.Set[Path]:
+        """
+        Gets the top level dirs of the git repos being searched.
+        :return: Set[Path]
+        """
+        return set(self._log)
+
+    @property
+    def modification_years(self) -> ty.Dict[Path, int]:
+        """
+        Gets the years in which found files were last modified.
+        :return: Dict[Path, int]
+        """
+        return {
+            Path(path): year
+            for path, year in self._modification_years().items()
+        }
 
     @property
     def format(self) -> str:
@@ -181,16 +725,250 @@ class Copywriter:
     def auto_header(self) -> str:
         """
         Determines the auto-generated header to be added.
+
+        The most common existing header format is used. If files have
+        already been checked, the format of every file is counted.
+        Otherwise, files are sampled from across the tree only until one
+        format clearly dominates, rather than reading every file.
         :return: owner str.
         """
         if not self._auto_format:
-            formats = [TxtFile(path).format for path in self.files]
-            filtered = filter(None, formats)
-            counter = collections.Counter(filtered)
+            import collections
+
+            counter: ty.Counter[str] = collections.Counter()
+            if self._outdated is not None:
+                # Formats were parsed while checking files.
+                counter.update(filter(None, (
+                    self._txt(path).format for path in self._files
+                )))
+            else:
+                import random
+
+                # Files are sampled in a shuffled order, so that no one
+                # dir (Ex: vendored code sorting first) decides the
+                # format. A fixed seed keeps results repeatable.
+                paths = sorted(self._files)
+                random.Random(0).shuffle(paths)
+                formats = (self._txt(path).format for path in paths)
+                for n_samples, fmt in enumerate(filter(None, formats), 1):
+                    counter[fmt] += 1
+                    if n_samples >= AUTO_HEADER_MAX_SAMPLES:
+                        break
+                    if n_samples >= AUTO_HEADER_MIN_SAMPLES:
+                        (_, first), *rest = counter.most_common(n=2)
+                        second = rest[0][1] if rest else 0
+                        if first > 2 * second:
+                            break
             self._auto_format = counter.most_common(n=1)[0][0]
         return self._auto_format
 
 
+class GitCommand:
+    """
+    Class running a git command in the background.
+
+    The command is started when the instance is created, and its output
+    is collected when first accessed.
+    """
+    def __init__(self, *args: str, cwd: PathLike) -> None:
+        self.args = ('git', *args)
+        self._output: ty.Optional[bytes] = None
+        self._done = False
+        self._proc = sub.Popen(
+            args=self.args,
+            cwd=cwd,
+            stdout=sub.PIPE,
+            stderr=sub.DEVNULL,
+        )
+
+    @property
+    def output(self) -> bytes:
+        """
+        Waits for the command to complete, and gets its output.
+        :return: bytes written to stdout by command.
+        :raises: CalledProcessError if command failed.
+        """
+        if self._output is None:
+            self._output, _ = self._proc.communicate()
+            self._done = True
+            self._check_returncode()
+        return self._output
+
+    def lines(self) -> ty.Iterator[str]:
+        """
+        Yields lines of output as they are written by the command,
+        rather than collecting all output at once.
+
+        May only be used once, and not together with `output`.
+        :return: Iterator[str] of lines, without line endings.
+        :raises: CalledProcessError if command failed.
+        """
+        for line in self._proc.stdout:
+            # Paths are decoded as file names are, since git writes
+            # them as raw bytes.
+            yield os.fsdecode(line).rstrip('\n')
+        self._proc.stdout.close()
+        self._proc.wait()
+        self._done = True
+        self._check_returncode()
+
+    def _check_returncode(self) -> None:
+        """ Raises CalledProcessError if the command failed. """
+        if self._proc.returncode:
+            raise sub.CalledProcessError(self._proc.returncode, self.args)
+
+    def __del__(self) -> None:
+        # Commands whose output was never needed are stopped.
+        if not self._done:
+            self._proc.kill()
+            self._proc.communicate()
+
+
+class HeaderCache:
+    """
+    Class keeping found copyright strings between runs.
+
+    Entries are kept in an sqlite database, keyed by file path and
+    copyright pattern, and are only used while the file's mtime and size
+    are unchanged, so that unchanged files need not be read again.
+
+    A cache which cannot be read or written is treated as empty.
+    """
+    def __init__(self, path: PathLike, copyright_re: str) -> None:
+        """
+        :param path: Path of cache database file.
+        :param copyright_re: Pattern used to find copyright notices.
+        """
+        self.path = Path(path)
+        self.copyright_re = copyright_re
+        # Stats of loaded files, which are stored with their entries.
+        self._stats: ty.Dict[str, ty.Tuple[int, int]] = {}
+
+    def load(
+            self, paths: ty.Iterable[str], dirs: ty.Iterable[str] = ()
+    ) -> ty.Dict[str, str]:
+        """
+        Gets the cached copyright strings of files which are unchanged
+        since they were stored.
+
+        Only the entries of the passed files are read. Entries of other
+        files within the passed dirs, such as deleted files, are removed.
+        :param paths: Paths of files.
+        :param dirs: Paths of dirs in which all files were passed.
+        :return: Dict[str, str] mapping unchanged files to their
+                    copyright strings.
+        """
+        import sqlite3
+
+        paths = list(paths)
+        try:
+            with self._connect() as db:
+                # Passed paths are joined against in a temporary table,
+                # rather than passed in chunks of `IN (...)` lists.
+                db.execute('CREATE TEMP TABLE checked (path TEXT PRIMARY KEY)')
+                db.executemany(
+                    'INSERT OR IGNORE INTO checked VALUES (?)',
+                    [(os.path.abspath(path),) for path in paths]
+                )
+                entries = {
+                    path: (mtime_ns, size, copyright_str)
+                    for path, mtime_ns, size, copyright_str in db.execute(
+                        'SELECT path, mtime_ns, size, copyright_str '
+                        'FROM headers JOIN checked USING (path) '
+                        'WHERE pattern = ?',
+                        (self.copyright_re,)
+                    )
+                }
+                for dir_ in dirs:
+                    # Paths within the dir sort between these bounds,
+                    # so the table's index is used to find them.
+                    start = os.path.join(os.path.abspath(dir_), '')
+                    end = start[:-1] + chr(ord(start[-1]) + 1)
+                    db.execute(
+                        'DELETE FROM headers WHERE pattern = ? AND '
+                        'path >= ? AND path < ? AND '
+                        'path NOT IN (SELECT path FROM checked)',
+                        (self.copyright_re, start, end)
+                    )
+        except (OSError, sqlite3.Error):
+            entries = {}
+        found: ty.Dict[str, str] = {}
+        for path in paths:
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            self._stats[path] = file_stat.st_mtime_ns, file_stat.st_size
+            entry = entries.get(os.path.abspath(path))
+            if entry is not None and entry[:2] == self._stats[path]:
+                found[path] = entry[2]
+        return found
+
+    def store(self, copyright_strs: ty.Mapping[str, str]) -> None:
+        """
+        Stores the copyright strings of loaded files.
+
+        Files are stored with their stats from when they were loaded,
+        so a file modified since then will not match its entry.
+        :param copyright_strs: Dict mapping files to copyright strings.
+        :return: None
+        """
+        import sqlite3
+
+        entries = [
+            (self.copyright_re, os.path.abspath(path),
+             *self._stats[path], copyright_str)
+            for path, copyright_str in copyright_strs.items()
+            if path in self._stats
+        ]
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?, ?)',
+                    entries
+                )
+        except (OSError, sqlite3.Error):
+            pass
+
+    def discard(self, paths: ty.Iterable[str]) -> None:
+        """
+        Removes the entries of modified files.
+        :param paths: Paths of files.
+        :return: None
+        """
+        import sqlite3
+
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    'DELETE FROM headers WHERE pattern = ? AND path = ?',
+                    [(self.copyright_re, os.path.abspath(path))
+                     for path in paths]
+                )
+        except (OSError, sqlite3.Error):
+            pass
+
+    @contextlib.contextmanager
+    def _connect(self) -> ty.Iterator[ty.Any]:
+        """
+        Opens the cache database, creating it if needed. Changes made
+        within the context are committed when it exits.
+        :return: Context manager yielding sqlite3.Connection.
+        """
+        import sqlite3
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(sqlite3.connect(str(self.path))) as db:
+            with db:
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS headers ('
+                    'pattern TEXT, path TEXT, mtime_ns INTEGER, '
+                    'size INTEGER, copyright_str TEXT, '
+                    'PRIMARY KEY (pattern, path))'
+                )
+                yield db
+
+
 class FileType(ty.NamedTuple):
     """
     Class holding file type info.
@@ -208,13 +986,48 @@ class TxtFile:
     Class handling a specific file's copyright header
     """
     def __init__(
-            self, path: PathLike, copyright_re: str = COPYRIGHT_REGEX
+            self,
+            path: PathLike,
+            copyright_re: ty.Union[str, ty.Pattern[str]] = COPYRIGHT_REGEX,
+            modification_year: ty.Union[
+                int, ty.Callable[[], ty.Optional[int]], None
+            ] = None,
+            head: ty.Optional[bytes] = None,
+            copyright_str: ty.Optional[str] = None,
     ) -> None:
-        self.path = Path(path)
-        self.copyright_re = copyright_re
-        self.type = recognize(self.path)
-
-        if not self.path.is_file():
+        """
+        :param path: Path of file.
+        :param copyright_re: Pattern used to find copyright notice.
+                    May be passed already compiled.
+        :param modification_year: Year in which file was last modified,
+                    if already known, or a function getting the year
+                    when needed, which returns None if unknown. If not
+                    passed or unknown, it will be retrieved from git
+                    when needed.
+        :param head: First HEAD_READ_SIZE bytes of file, if already
+                    read. If not passed, they will be read when needed.
+        :param copyright_str: Copyright string found in file, if
+                    already known. If not passed, it will be read from
+                    the file when needed.
+        """
+        # The path is kept as a str, which is all that os functions need,
+        # and only converted to a Path when accessed.
+        self._path_str = os.fspath(path)
+        self._path: ty.Optional[Path] = None
+        self._copyright_pat = _compile_copyright_re(copyright_re)
+        self.copyright_re = self._copyright_pat.pattern
+        if callable(modification_year):
+            self._modification_year: ty.Optional[int] = None
+            self._get_modification_year = modification_year
+        else:
+            self._modification_year = modification_year
+            self._get_modification_year = None
+        self._copyright_str = copyright_str
+        self._format: ty.Optional[str] = None
+        self._head = head
+        self.type = recognize(self._path_str)
+
+        if not os.path.isfile(self._path_str):
             raise ValueError(f'Expected a file path. Got a dir: {self.path}')
 
         if not self.type:
@@ -225,38 +1038,107 @@ class TxtFile:
         Updates the copyright header in a file.
         :return: None
         """
-        updated_copyright = re.sub(
-            pattern=YEAR_PATTERN,
-            repl=f'{self.year_range.start}-{self.modification_year}',
-            string=self.copyright_str,
-            count=1
+        updated_copyright = _splice_year(
+            self.copyright_str,
+            f'{self.year_range.start}-{self.modification_year}'
         )
-        with self.path.open('r+') as f:
-            new_content = re.sub(
-                pattern=self.copyright_re,
+        with open(self._path_str) as f:
+            # Only the head of the file, which contains the copyright
+            # notice, needs to be read into memory.
+            head = f.read(HEAD_READ_SIZE) + f.readline()
+            while (
+                not self._copyright_pat.search(head) and
+                len(head) < MAX_HEAD_READ_SIZE
+            ):
+                more = f.read(HEAD_READ_SIZE)
+                if not more:
+                    break
+                head += more + f.readline()
+            new_head = self._copyright_pat.sub(
                 repl=updated_copyright,
-                string=f.read(),
+                string=head,
                 count=1
             )
-            f.seek(0)
-            f.write(new_content)
+            tmp_path = self._copy_with_head(new_head, f)
+        # The original is only replaced once closed, which
+        # Windows requires.
+        self._replace(tmp_path)
 
     def add(self, fmt: str) -> None:
         """
         Adds a copyright header where one was previously missing.
+
+        The year is inserted with str.replace rather than str.format, so
+        that other braces in the format are kept as written.
+        :param fmt: Header format. (Ex: 'Copyright {year} Bob')
         :return: None
         """
-        notice = fmt.format(year=self.modification_year)
-        with self.path.open('r+') as f:
-            lines = f.readlines()
+        notice = fmt.replace('{year}', str(self.modification_year))
+        with open(self._path_str) as f:
+            # Notices are added within the opening lines; the rest of
+            # the file is copied unmodified.
+            lines = list(itertools.islice(f, 3))
             if self.type.block_start:
                 self._add_block_notice(lines, notice)
             else:
                 self._add_comment_notice(lines, notice)
 
             # Write modified lines to file.
-            f.seek(0)
-            f.writelines(lines)
+            tmp_path = self._copy_with_head(''.join(lines), f)
+        self._replace(tmp_path)
+
+    def _copy_with_head(self, head: str, rest: ty.TextIO) -> str:
+        """
+        Writes the passed head followed by the remaining content of the
+        passed file object to a temporary file beside the file, which
+        may then replace it using _replace().
+
+        The remainder is streamed in chunks, so the whole file is never
+        held in memory.
+
+        :param head: Text to write at start of file.
+        :param rest: File object from which remaining text is copied.
+        :return: str path of temporary file.
+        """
+        import shutil
+        import tempfile
+
+        path = os.path.realpath(self._path_str)
+        with tempfile.NamedTemporaryFile(
+                'w',
+                dir=os.path.dirname(path),
+                prefix=f'.{os.path.basename(path)}.',
+                delete=False,
+        ) as tmp:
+            try:
+                tmp.write(head)
+                shutil.copyfileobj(rest, tmp, length=COPY_BUFFER_SIZE)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        return tmp.name
+
+    def _replace(self, tmp_path: str) -> None:
+        """
+        Replaces the file with a temporary file written by
+        _copy_with_head(). The file must no longer be open.
+        :param tmp_path: Path of temporary file.
+        :return: None
+        """
+        import shutil
+
+        path = os.path.realpath(self._path_str)
+        try:
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # Values parsed from the previous content are dropped.
+        self._copyright_str = None
+        self._format = None
 
     def _add_comment_notice(self, lines: ty.List[str], notice: str) -> None:
         """
@@ -278,6 +1160,8 @@ class TxtFile:
         """
         Adds a copyright notice using comment block ('/** ... */')
         """
+        import string
+
         if self.type.block_start:
             block_start = self.type.block_start
         else:
@@ -333,15 +1217,86 @@ class TxtFile:
         else:
             expand_existing_block(block_i)
 
+    @property
+    def path(self) -> Path:
+        """
+        Gets path of file.
+        :return: Path
+        """
+        if self._path is None:
+            self._path = Path(self._path_str)
+        return self._path
+
     @property
     def copyright_str(self) -> str:
         """
         Gets existing copyright string from a file.
         :return: Copyright str or empty string if not present.
         """
-        with self.path.open() as f:
-            match = re.search(self.copyright_re, f.read(1000))
-            return match.group() if match is not None else ''
+        if self._copyright_str is None:
+            head = self._read_head()
+            if self._copyright_pat is _DEFAULT_COPYRIGHT_RE:
+                # The default pattern is searched for in the undecoded
+                # head, so that only the notice itself is decoded.
+                match = _DEFAULT_COPYRIGHT_BYTES_RE.search(head)
+                self._copyright_str = (
+                    match.group().decode('utf-8', errors='replace')
+                    if match is not None else ''
+                )
+            else:
+                match = self._copyright_pat.search(_decode(head))
+                self._copyright_str = (
+                    match.group() if match is not None else ''
+                )
+        return self._copyright_str
+
+    def _read_head(self) -> bytes:
+        """
+        Reads the start of the file, in which a copyright notice
+        is expected.
+
+        The file is read with os.read rather than through a buffered
+        text file object, since usually only a single small read is
+        needed. If the read ends within a comment block, the rest of the
+        block is read as well.
+        :return: bytes
+        """
+        if self._head is not None:
+            # Passed content is only used once; the file may
+            # be modified afterwards.
+            head, self._head = self._head, None
+        else:
+            head = read_head(self._path_str)
+        if len(head) == HEAD_READ_SIZE and self._ends_in_block(head):
+            with open(self._path_str, 'rb') as f:
+                f.seek(len(head))
+                while len(head) < MAX_HEAD_READ_SIZE:
+                    chunk = f.read(HEAD_READ_SIZE)
+                    head += chunk
+                    if (
+                        len(chunk) < HEAD_READ_SIZE or
+                        not self._ends_in_block(head)
+                    ):
+                        break
+        return head
+
+    def _ends_in_block(self, head: bytes) -> bool:
+        """
+        Checks whether the passed start of the file ends within its first
+        comment block.
+        :param head: Start of file content.
+        :return: True if a block is opened but not closed.
+        """
+        if not self.type.block_start:
+            return False
+        start = head.find(self.type.block_start.encode())
+        if start == -1:
+            return False
+        end = head.find(
+            self.type.block_end.strip().encode(),
+            start + len(self.type.block_start)
+        )
+        return end == -1
 
     @property
     def year_range(self) -> ty.Optional[range]:
@@ -357,16 +1312,11 @@ class TxtFile:
         copyright_s = self.copyright_str
         if not copyright_s:
             raise ValueError('No copyright string found.')
-        match = re.search(YEAR_PATTERN, copyright_s, flags=re.IGNORECASE)
+        match = _YEAR_RE.search(copyright_s)
         if not match:
             return None
-        s = match.group()
-        years = [int(y) for y in re.findall('[0-9]{4}', s)]
-        if len(years) not in (1, 2):
-            raise ValueError(
-                f'Confusing header found: {repr(s)} in {self.path}'
-            )
-        return range(years[0], years[-1] + 1)
+        start, end = match.group('start', 'end')
+        return range(int(start), int(end or start) + 1)
 
     @property
     def modification_year(self) -> int:
@@ -375,17 +1325,22 @@ class TxtFile:
         last modified.
         :return: int
         """
+        if self._get_modification_year is not None:
+            self._modification_year = self._get_modification_year()
+            self._get_modification_year = None
+        if self._modification_year is not None:
+            return self._modification_year
         try:
             date_str = sub.check_output(
                 args=(
                     'git', 'log', '-1', '--format="%ad"', '--date=format:"%Y"',
-                    '--', f'{self.path.name}'
+                    '--', os.path.basename(self._path_str)
                 ),
-                cwd=self.path.parent,
+                cwd=os.path.dirname(self._path_str) or '.',
                 encoding='utf-8',
             ).strip('\'"\n')
-            year = int(date_str)
-            return year
+            self._modification_year = int(date_str)
+            return self._modification_year
         except Exception as ex:
             raise ValueError(
                 f'Failed to get modification year for {self.path.name}'
@@ -406,6 +1361,14 @@ class TxtFile:
             return False
         if year_range is None:
             return False
+        if self._modification_year is None:
+            # Files are written before they are committed, so if the
+            # file has not been written to since the header's last year,
+            # git need not be asked when it was last modified. Years
+            # passed as ints are used as given.
+            fs_year = time.localtime(os.stat(self._path_str).st_mtime).tm_year
+            if fs_year < year_range.stop:
+                return False
         return self.modification_year >= year_range.stop
 
     @property
@@ -415,30 +1378,312 @@ class TxtFile:
 
         :return: header format str (Ex: 'Copyright 2019 Bob') or None
         """
-        try:
-            return re.sub(
-                pattern=YEAR_PATTERN,
-                repl='{year}',
-                string=self.copyright_str,
-                count=1
-            )
-        except ValueError:
-            return None
+        if self._format is None:
+            try:
+                self._format = _splice_year(self.copyright_str, '{year}')
+            except ValueError:
+                return None
+        return self._format
 
     def __repr__(self) -> str:
         return f'TxtFile[{self.path}]'
 
 
-def recognize(path: Path) -> FileType:
+def _check_header(txt: TxtFile) -> ty.Tuple[bool, bool]:
+    """
+    Checks a file's copyright header.
+
+    The header's format is parsed as well, so that it is cached by the
+    TxtFile for auto_header.
+    :return: Tuple of whether the header is missing, and whether it
+                is outdated.
+    """
+    if not txt.copyright_str:
+        return True, False
+    _ = txt.format  # Cached by the TxtFile.
+    return False, txt.header_is_outdated
+
+
+def _compile_copyright_re(
+        copyright_re: ty.Union[str, ty.Pattern[str]]
+) -> ty.Pattern[str]:
+    """
+    Gets compiled copyright pattern, reusing the module's pattern for
+    the default regex.
+    :param copyright_re: Copyright regex str or compiled pattern.
+    :return: Compiled pattern.
+    """
+    if copyright_re == COPYRIGHT_REGEX:
+        return _DEFAULT_COPYRIGHT_RE
+    return re.compile(copyright_re)
+
+
+def _decode(content: bytes) -> str:
+    """
+    Decodes file content, translating newlines as by open().
+    :param content: File content.
+    :return: str
+    """
+    text = content.decode('utf-8', errors='replace')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _splice_year(s: str, years: str) -> str:
+    """
+    Replaces the first year or year range in a string.
+
+    The matched span is replaced directly, rather than by re.sub, which
+    would also process the replacement as a template.
+    :param s: String containing year(s). (Ex: 'Copyright 2019 Bob')
+    :param years: Replacement for year(s). (Ex: '2019-2020')
+    :return: str with years replaced, or unchanged if it had none.
+    """
+    match = _YEAR_RE.search(s)
+    if match is None:
+        return s
+    start, end = match.span()
+    return s[:start] + years + s[end:]
+
+
+def read_head(path: PathLike) -> bytes:
+    """
+    Reads the first HEAD_READ_SIZE bytes of a file.
+    :param path: Path of file.
+    :return: bytes
+    """
+    try:
+        # Avoid updating access times when scanning large repos.
+        fd = os.open(path, _READ_FLAGS | _O_NOATIME)
+    except PermissionError:
+        # O_NOATIME is only permitted for the file's owner.
+        fd = os.open(path, _READ_FLAGS)
+    try:
+        return os.read(fd, HEAD_READ_SIZE)
+    finally:
+        os.close(fd)
+
+
+def read_heads(paths: ty.Iterable[str]) -> ty.Dict[str, bytes]:
+    """
+    Reads the first HEAD_READ_SIZE bytes of many files at once, using
+    io_uring.
+
+    Each file's open, read, and close are submitted as a linked chain,
+    and up to URING_BATCH_SIZE chains are submitted with one syscall.
+
+    Requires the optional liburing package (`pip install copywriter[fast]`)
+    and a Linux kernel supporting io_uring direct descriptors.
+    :param paths: Paths of files to read.
+    :return: Dict[str, bytes] of files which were read. Files are
+                omitted if io_uring is unavailable or reading failed,
+                so that they may be read by read_head() instead.
+    """
+    try:
+        import liburing
+    except ImportError:
+        return {}
+    paths = list(paths)
+    heads: ty.Dict[str, bytes] = {}
+    ring = liburing.Ring()
+    cqe = liburing.Cqe()
+    try:
+        liburing.io_uring_queue_init(URING_BATCH_SIZE * 3, ring)
+    except OSError:
+        return {}
+    try:
+        liburing.io_uring_register_files_sparse(ring, URING_BATCH_SIZE)
+        for start in range(0, len(paths), URING_BATCH_SIZE):
+            batch = paths[start:start + URING_BATCH_SIZE]
+            buffers = [bytearray(HEAD_READ_SIZE) for _ in batch]
+            for i, (path, buffer) in enumerate(zip(batch, buffers)):
+                # The file is opened into slot i of the ring's file
+                # table, which the linked read and close then refer to.
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_open_direct(
+                    sqe, path, _READ_FLAGS | _O_NOATIME, i
+                )
+                liburing.io_uring_sqe_set_flags(sqe, liburing.IOSQE_IO_LINK)
+                liburing.io_uring_sqe_set_data64(sqe, i * 3)
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_read(sqe, i, buffer)
+                liburing.io_uring_sqe_set_flags(
+                    sqe, liburing.IOSQE_FIXED_FILE | liburing.IOSQE_IO_LINK
+                )
+                liburing.io_uring_sqe_set_data64(sqe, i * 3 + 1)
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_close_direct(sqe, i)
+                liburing.io_uring_sqe_set_data64(sqe, i * 3 + 2)
+
+            liburing.io_uring_submit(ring)
+            # Completions are taken one at a time, so that only the
+            # entry at the head of the completion queue is ever read.
+            for _ in range(len(batch) * 3):
+                liburing.io_uring_wait_cqe(ring, cqe)
+                entry = cqe[0]
+                i, op = divmod(liburing.io_uring_cqe_get_data64(entry), 3)
+                try:
+                    size = entry.res
+                except OSError:
+                    size = -1  # Failed or cancelled.
+                liburing.io_uring_cqe_seen(ring, entry)
+                if op == 1 and i < len(batch) and size >= 0:
+                    heads[batch[i]] = bytes(buffers[i][:size])
+    except Exception:
+        pass  # Remaining files will be read by read_head().
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return heads
+
+
+def recognize(path: PathLike) -> FileType:
     """
     Attempts to recognize a file's type.
     :param path: Path to file to recognize.
     :return: FileType or None.
     """
-    for t in file_types.values():
-        for pat in t.patterns:
-            if fnmatch.fnmatch(path.name, pat):
-                return t
+    return _recognize_by_name(os.path.basename(path))
+
+
+@functools.lru_cache(maxsize=4096)
+def _recognize_by_name(name: str) -> ty.Optional[FileType]:
+    """
+    Attempts to recognize a file's type from its name.
+
+    Results are cached, since each found file is recognized both while
+    searching and by its TxtFile, and many files share a name.
+    :param name: File name, without dir.
+    :return: FileType or None.
+    """
+    match = _FILE_TYPE_RE.match(os.path.normcase(name))
+    if match is not None:
+        return _FILE_TYPE_GROUPS[match.lastgroup]
+
+
+def git_top_level(path: Path) -> Path:
+    """
+    Finds the top level directory of the git repo containing a path.
+    :param path: Path to dir within a git repo.
+    :return: Path of repo's top level dir.
+    :raises: ValueError if path is not within a git repo.
+    """
+    try:
+        return Path(sub.check_output(
+            args=('git', 'rev-parse', '--show-toplevel'),
+            cwd=path,
+            stderr=sub.DEVNULL,
+            encoding='utf-8',
+        ).strip()).resolve()
+    except (OSError, sub.CalledProcessError) as ex:
+        raise ValueError(f'Not within a git repo: {path}') from ex
+
+
+def git_has_commit_graph(top_level: Path) -> bool:
+    """
+    Checks whether a git repo has a commit-graph with changed-path Bloom
+    filters written.
+
+    Without one, `git log -- <path>` must check the trees of every
+    commit in the repo's history. A commit-graph written without
+    --changed-paths (Ex: by `git gc`) does not avoid this, so it
+    is not counted.
+    :param top_level: Path of repo's top level dir.
+    :return: True if a commit-graph (or every graph in a commit-graph
+                chain) has Bloom filters.
+    """
+    common_dir = sub.check_output(
+        args=('git', 'rev-parse', '--git-common-dir'),
+        cwd=top_level,
+        encoding='utf-8',
+    ).strip()
+    info = Path(top_level, common_dir, 'objects', 'info')
+    graph = Path(info, 'commit-graph')
+    chain = Path(info, 'commit-graphs', 'commit-graph-chain')
+    # As by git, a single commit-graph file is used over a chain.
+    if graph.is_file():
+        graphs = [graph]
+    elif chain.is_file():
+        graphs = [
+            Path(chain.parent, f'graph-{graph_hash}.graph')
+            for graph_hash in chain.read_text().split()
+        ]
+    else:
+        return False
+    return bool(graphs) and all(map(_graph_has_bloom_filters, graphs))
+
+
+def _graph_has_bloom_filters(path: Path) -> bool:
+    """
+    Checks whether a commit-graph file has the chunks holding changed-path
+    Bloom filters.
+    :param path: Path of commit-graph file.
+    :return: True if the file has BIDX and BDAT chunks.
+    """
+    try:
+        with path.open('rb') as f:
+            # The header is followed by a table of chunk ids and offsets.
+            header = f.read(8)
+            if len(header) < 8 or header[:4] != b'CGPH':
+                return False
+            n_chunks = header[6]
+            table = f.read(n_chunks * 12)
+    except OSError:
+        return False
+    chunk_ids = {table[i:i + 4] for i in range(0, len(table), 12)}
+    return {b'BIDX', b'BDAT'} <= chunk_ids
+
+
+def git_commit_count(
+        top_level: Path, max_count: ty.Optional[int] = None
+) -> int:
+    """
+    Gets the number of commits reachable from HEAD in a git repo.
+    :param top_level: Path of repo's top level dir.
+    :param max_count: Number of commits at which to stop counting, so
+                that the history of a large repo need not be walked.
+    :return: int. 0 if the repo has no commits.
+    """
+    args = ['git', 'rev-list', '--count', 'HEAD']
+    if max_count is not None:
+        args.insert(2, f'--max-count={max_count}')
+    try:
+        return int(sub.check_output(
+            args=args,
+            cwd=top_level,
+            stderr=sub.DEVNULL,
+            encoding='utf-8',
+        ))
+    except sub.CalledProcessError:
+        return 0  # HEAD does not yet point to a commit.
+
+
+def write_git_commit_graph(top_level: Path) -> None:
+    """
+    Writes a commit-graph with changed-path bloom filters for a git repo,
+    which speeds up finding the commits that modified a file.
+    :param top_level: Path of repo's top level dir.
+    :return: None
+    """
+    sub.check_call(
+        args=(
+            'git', 'commit-graph', 'write', '--reachable', '--changed-paths'
+        ),
+        cwd=top_level,
+    )
+
+
+def default_cache_path() -> Path:
+    """
+    Gets the path of the per-user HeaderCache used by the command line
+    tool.
+    :return: Path
+    """
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData/Local'
+    elif sys.platform == 'darwin':
+        base = Path.home() / 'Library/Caches'
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base, 'copywriter', 'headers.sqlite3')
 
 
 def fmt_file_list(paths: ty.Iterable[Path]) -> str:
@@ -450,6 +1695,8 @@ def fmt_file_list(paths: ty.Iterable[Path]) -> str:
 
 def main():
     """ Main entry point for copywriter. """
+    import argparse
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'path', nargs='*', default=['.'],
@@ -479,6 +1726,16 @@ def main():
         '--filter-re', nargs='+', default='',
         help='Pattern to limit header changes to.'
     )
+    parser.add_argument(
+        '--write-commit-graph', action='store_true',
+        help='Write a git commit-graph where missing, to speed up '
+             'future runs.'
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='Read every file, rather than reusing copyright notices found '
+             'in unchanged files by previous runs.'
+    )
     args = parser.parse_args()
 
     copywriter = Copywriter(
@@ -486,6 +1743,7 @@ def main():
         fmt=args.format,
         copyright_re=args.copyright_re,
         filter_re=args.filter_re,
+        cache_path=None if args.no_cache else default_cache_path(),
     )
     if not copywriter.files:
         print(
@@ -494,6 +1752,21 @@ def main():
         )
         return -1
 
+    for repo in copywriter.repos:
+        if git_has_commit_graph(repo):
+            continue
+        if args.write_commit_graph:
+            write_git_commit_graph(repo)
+        elif git_commit_count(
+                repo, max_count=COMMIT_GRAPH_HINT_THRESHOLD + 1
+        ) > COMMIT_GRAPH_HINT_THRESHOLD:
+            print(
+                f'{repo} has no commit-graph. Run '
+                '`git commit-graph write --reachable --changed-paths` '
+                'or pass --write-commit-graph to speed up copywriter.',
+                file=sys.stderr
+            )
+
     if args.show or not (args.update or args.add_missing):
         copywriter.show()
     if args.update:
@@ -533,6 +1806,20 @@ file_types = {f_type.name: f_type for f_type in (
     ),
 )}
 
+# All file type patterns are combined into a single regex, with one named
+# group per type, so that recognizing a file takes a single match.
+# Alternatives are ordered as in file_types, so the first matching type
+# is still the one recognized.
+_FILE_TYPE_GROUPS = {
+    f'type{i}': f_type for i, f_type in enumerate(file_types.values())
+}
+_FILE_TYPE_RE = re.compile('|'.join(
+    f'(?P<{group}>' + '|'.join(
+        fnmatch.translate(os.path.normcase(pat)) for pat in f_type.patterns
+    ) + ')'
+    for group, f_type in _FILE_TYPE_GROUPS.items()
+))
+
 
 if __name__ == '__main__':
     exit(main())
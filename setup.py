@@ -4,6 +4,9 @@ from setuptools import setup
 setup(
     name='copywriter',
     tests_require=['pytest'],
+    extras_require={
+        'fast': ['liburing>=2026.3.30; sys_platform == "linux"'],
+    },
     python_requires='>=3.6',
     py_modules=['copywriter'],
     entry_points={
@@ -1,11 +1,15 @@
 """
 Tests copywriter functionality.
 """
-import glob
+import os
 from pathlib import Path
 import shutil
-import tempfile
+import subprocess
 import textwrap
+import time
+import typing as ty
+
+import pytest
 
 import copywriter
 
@@ -39,6 +43,158 @@ def test_find_files():
     assert found == expected
 
 
+def test_nested_roots_are_searched_once():
+    found = copywriter.Copywriter._find_files(
+        Path(SAMPLE, 'src'), Path(SAMPLE, 'include', '..'),
+        Path(SAMPLE, 'include', 'nested_dir'),
+    )
+    assert len(found) == len({os.path.realpath(path) for path in found})
+    assert str(Path(SAMPLE, 'include', '..', 'src', 'bar.c')) in found
+
+
+def test_only_tracked_files_are_found(tmp_path):
+    for name in ('foo.py', 'untracked.py', '.hidden/bar.py', 'readme.md'):
+        Path(tmp_path, name).parent.mkdir(exist_ok=True)
+        Path(tmp_path, name).write_text('# Copyright 2019 Bob\n')
+    _commit(tmp_path, 'foo.py', '.hidden/bar.py', 'readme.md')
+    found = copywriter.Copywriter(tmp_path).files
+    assert found == {Path(tmp_path, 'foo.py')}
+
+
+def test_files_in_nested_repos_are_found(tmp_path):
+    outer = Path(tmp_path, 'outer')
+    inner = Path(outer, 'inner')
+    inner.mkdir(parents=True)
+    Path(outer, 'foo.py').write_text('# Copyright 2019 Bob\n')
+    Path(inner, 'bar.py').write_text('# Copyright 2019 Bob\n')
+    _commit(inner, 'bar.py')
+    _commit(outer, 'foo.py')
+    expected = {Path(outer, 'foo.py'), Path(inner, 'bar.py')}
+    assert copywriter.Copywriter(tmp_path).files == expected
+    assert copywriter.Copywriter(outer).files == expected
+
+
+def test_files_in_submodules_are_found(tmp_path):
+    lib = Path(tmp_path, 'lib')
+    lib.mkdir()
+    Path(lib, 'bar.py').write_text('# Copyright 2019 Bob\n')
+    _commit(lib, 'bar.py')
+    repo = Path(tmp_path, 'repo')
+    repo.mkdir()
+    Path(repo, 'foo.py').write_text('# Copyright 2019 Bob\n')
+    _commit(repo, 'foo.py')
+    subprocess.check_call(
+        ('git', '-c', 'protocol.file.allow=always', 'submodule', 'add',
+         '-q', str(lib), 'lib'),
+        cwd=repo
+    )
+    expected = {Path(repo, 'foo.py'), Path(repo, 'lib', 'bar.py')}
+    assert copywriter.Copywriter(repo).files == expected
+
+
+def test_untracked_dirs_are_not_walked(tmp_path, monkeypatch):
+    Path(tmp_path, 'foo.py').write_text('# Copyright 2019 Bob\n')
+    _commit(tmp_path, 'foo.py')
+    Path(tmp_path, 'build').mkdir()
+    Path(tmp_path, 'build', 'bar.py').write_text('# Copyright 2019 Bob\n')
+
+    def scandir(path):
+        raise AssertionError('{} was walked'.format(path))
+
+    monkeypatch.setattr(os, 'scandir', scandir)
+    writer = copywriter.Copywriter(tmp_path)
+    assert writer.files == {Path(tmp_path, 'foo.py')}
+
+
+def test_file_found_from_two_roots_is_kept_once(repo_copy, monkeypatch):
+    monkeypatch.chdir(repo_copy)
+    path = Path('test/resources/sample/src/CMakeLists.txt')
+    files = copywriter.Copywriter(Path('.'), path)._files
+    assert str(path) in files
+    assert len(files) == len({os.path.realpath(name) for name in files})
+
+
+def test_missing_headers_are_found_before_first_commit(tmp_path):
+    Path(tmp_path, 'foo.py').write_text('print("foo")\n')
+    subprocess.check_call(('git', 'init', '-q'), cwd=tmp_path)
+    subprocess.check_call(('git', 'add', 'foo.py'), cwd=tmp_path)
+    writer = copywriter.Copywriter(tmp_path)
+    assert writer.missing == {Path(tmp_path, 'foo.py')}
+    assert writer.modification_years == {}
+
+
+def test_modification_year_of_non_utf8_file_name_is_found(tmp_path):
+    name = os.fsdecode(b'caf\xe9.py')
+    Path(tmp_path, name).write_text('# Copyright 2019 Bob\n')
+    _commit(tmp_path, name)
+    writer = copywriter.Copywriter(tmp_path)
+    assert set(writer.modification_years) == {Path(tmp_path, name)}
+
+
+def test_commits_are_counted(tmp_path):
+    Path(tmp_path, 'foo.py').write_text('print("foo")\n')
+    subprocess.check_call(('git', 'init', '-q'), cwd=tmp_path)
+    assert copywriter.git_commit_count(tmp_path) == 0
+    _commit(tmp_path, 'foo.py')
+    assert copywriter.git_commit_count(tmp_path) == 1
+    assert copywriter.git_commit_count(ROOT, max_count=1) == 1
+
+
+def test_commit_graph_without_bloom_filters_is_not_counted(tmp_path):
+    Path(tmp_path, 'foo.py').write_text('print("foo")\n')
+    _commit(tmp_path, 'foo.py')
+    assert not copywriter.git_has_commit_graph(tmp_path)
+    subprocess.check_call(
+        ('git', 'commit-graph', 'write', '--reachable'), cwd=tmp_path
+    )
+    assert not copywriter.git_has_commit_graph(tmp_path)
+    copywriter.write_git_commit_graph(tmp_path)
+    assert copywriter.git_has_commit_graph(tmp_path)
+
+
+def test_git_is_run_once_per_repo(monkeypatch):
+    commands = []
+    popen = subprocess.Popen
+
+    def record(args, *a, **kw):
+        commands.append(args)
+        return popen(args, *a, **kw)
+
+    monkeypatch.setattr(subprocess, 'Popen', record)
+    roots = [path for path in SAMPLE.rglob('*') if path.is_file()]
+    copywriter.Copywriter(*roots).outdated
+    assert len(commands) == 2
+
+
+def test_large_files_are_skipped(tmp_path):
+    Path(tmp_path, 'small.c').write_text('int x;\n')
+    Path(tmp_path, 'large.c').write_bytes(
+        b' ' * (copywriter.MAX_FILE_SIZE + 1)
+    )
+    found = set(copywriter.Copywriter._discover(str(tmp_path)))
+    assert found == {str(Path(tmp_path, 'small.c'))}
+
+
+def test_file_types_are_recognized():
+    recognized = {
+        name: getattr(copywriter.recognize(Path(name)), 'name', None)
+        for name in (
+            'foo.c', 'foo.hpp', 'foo.py', 'CMakeLists.txt', 'foo.cmake',
+            'foo.sh', 'readme.md', 'foo.c.orig',
+        )
+    }
+    assert recognized == {
+        'foo.c': 'c-style',
+        'foo.hpp': 'c-style',
+        'foo.py': 'py-style',
+        'CMakeLists.txt': 'cmake',
+        'foo.cmake': 'cmake',
+        'foo.sh': 'bash',
+        'readme.md': None,
+        'foo.c.orig': None,
+    }
+
+
 def test_copyright_header_is_found_in_cmake():
     txt = copywriter.TxtFile(Path(SAMPLE, 'CMakeLists.txt'))
     assert txt.copyright_str == 'Copyright 2019-2020 Bob'
@@ -69,6 +225,57 @@ def test_copyright_header_is_found_in_c_line_comment():
     assert txt.copyright_str == 'Copyright 2018-2019 Bob'
 
 
+def test_copyright_header_is_found_with_crlf_newlines(tmp_path):
+    path = Path(tmp_path, 'build.sh')
+    path.write_bytes(b'#!/usr/bin/env bash\r\n# Copyright 2019 Bob\r\n')
+    txt = copywriter.TxtFile(path)
+    assert txt.copyright_str == 'Copyright 2019 Bob'
+
+
+def test_non_ascii_copyright_header_is_found(tmp_path):
+    path = Path(tmp_path, 'foo.py')
+    path.write_bytes('# Copyright 2019 Zoë\r\n'.encode())
+    assert copywriter.TxtFile(path).copyright_str == 'Copyright 2019 Zoë'
+    txt = copywriter.TxtFile(path, copyright_re='Copyright [0-9]+ \\w+')
+    assert txt.copyright_str == 'Copyright 2019 Zoë'
+
+
+def test_copyright_header_is_found_after_long_block(tmp_path):
+    path = Path(tmp_path, 'foo.c')
+    doc = ' * Documentation text\n' * 300
+    path.write_text(f'/**\n{doc} * Copyright 2019 Bob\n */\nint x;\n')
+    txt = copywriter.TxtFile(path, modification_year=2020)
+    assert txt.copyright_str == 'Copyright 2019 Bob'
+    txt.update()
+    assert txt.copyright_str == 'Copyright 2019-2020 Bob'
+
+
+def test_year_range_is_parsed():
+    year_ranges = [
+        copywriter.TxtFile(Path(SAMPLE, 'scripts', name)).year_range
+        for name in ('baz.py', 'foo.py')
+    ]
+    assert year_ranges == [range(2019, 2020), range(2019, 2021)]
+
+
+def test_heads_are_read_with_io_uring():
+    pytest.importorskip('liburing')
+    paths = [str(path) for path in SAMPLE.rglob('*') if path.is_file()]
+    heads = copywriter.read_heads(paths + [str(Path(SAMPLE, 'missing.py'))])
+    assert heads == {path: copywriter.read_head(path) for path in paths}
+
+
+def test_heads_of_many_files_are_read_with_io_uring(tmp_path):
+    pytest.importorskip('liburing')
+    paths = []
+    for i in range(copywriter.URING_BATCH_SIZE * 3 + 1):
+        path = Path(tmp_path, f'{i}.py')
+        path.write_text(f'# Copyright 2019 Bob {i}\n')
+        paths.append(str(path))
+    heads = copywriter.read_heads(paths)
+    assert heads == {path: copywriter.read_head(path) for path in paths}
+
+
 def test_missing_headers_are_found():
     roots = [Path(SAMPLE, name) for name in (
         'cmake', 'include', 'scripts', 'src',
@@ -95,24 +302,101 @@ def test_outdated_headers_are_found():
     assert found == expected
 
 
-def test_year_range_update(tmp_path):
+def test_cached_headers_are_reused(tmp_path):
+    roots = [Path(SAMPLE, name) for name in ('scripts', 'src')]
+    cache_path = Path(tmp_path, 'cache.sqlite3')
+    first = copywriter.Copywriter(*roots, cache_path=cache_path)
+    second = copywriter.Copywriter(*roots, cache_path=cache_path)
+    assert first.missing == second.missing
+    assert first.outdated == second.outdated
+    assert second._cached_strs.keys() == second._files
+
+
+def test_cached_header_of_changed_file_is_ignored(tmp_path):
+    path = Path(tmp_path, 'foo.py')
+    path.write_text('# Copyright 2019 Bob\n')
+    cache = copywriter.HeaderCache(Path(tmp_path, 'cache'), 'Copyright .*')
+    assert cache.load([str(path)]) == {}
+    cache.store({str(path): 'Copyright 2019 Bob'})
+    assert cache.load([str(path)]) == {str(path): 'Copyright 2019 Bob'}
+    path.write_text('# Copyright 2019-2020 Bob\n')
+    assert cache.load([str(path)]) == {}
+
+
+def test_cached_headers_of_deleted_files_are_removed(tmp_path):
+    import sqlite3
+
+    src = Path(tmp_path, 'src')
+    src.mkdir()
+    paths = [str(Path(src, name)) for name in ('foo.py', 'bar.py')]
+    other = str(Path(tmp_path, 'other.py'))
+    for path in (*paths, other):
+        Path(path).write_text('# Copyright 2019 Bob\n')
+    cache = copywriter.HeaderCache(Path(tmp_path, 'cache'), 'Copyright .*')
+    cache.load([*paths, other])
+    cache.store(dict.fromkeys([*paths, other], 'Copyright 2019 Bob'))
+
+    os.remove(paths[1])
+    cache = copywriter.HeaderCache(Path(tmp_path, 'cache'), 'Copyright .*')
+    assert cache.load(paths[:1], [str(src)]) == {
+        paths[0]: 'Copyright 2019 Bob'
+    }
+    db = sqlite3.connect(str(Path(tmp_path, 'cache')))
+    try:
+        cached = {path for path, in db.execute('SELECT path FROM headers')}
+    finally:
+        db.close()
+    assert cached == {paths[0], other}
+
+
+def test_modification_years_are_found():
+    roots = [Path(SAMPLE, name) for name in ('scripts', 'src')]
+    writer = copywriter.Copywriter(*roots)
+    assert writer.modification_years == {
+        path: copywriter.TxtFile(path).modification_year
+        for path in writer.files
+    }
+
+
+def test_passed_modification_year_is_used():
+    txt = copywriter.TxtFile(
+        Path(SAMPLE, 'CMakeLists.txt'), modification_year=2021
+    )
+    assert txt.header_is_outdated
+
+
+def test_unwritten_file_is_not_outdated(get_test_file):
+    """ Tests that files not written since their header are not outdated """
+    bar = get_test_file('sample/src/bar.c')
+    mtime = time.mktime((2019, 6, 1, 0, 0, 0, 0, 0, -1))
+    os.utime(bar, (mtime, mtime))
+    assert not copywriter.TxtFile(bar).header_is_outdated
+
+
+def test_year_range_update(get_test_file):
     """ Tests that a copyright header's years are updated correctly """
-    shutil.copytree(src=ROOT, dst=Path(tmp_path, 'sample'))
-    bar = Path(tmp_path, 'sample/test/resources/sample/src/bar.c')
+    bar = get_test_file('sample/src/bar.c')
     copywriter.TxtFile(bar).update()
     with bar.open() as f:
         assert f.read() == '// Copyright 2018-2020 Bob\n'
 
 
-def test_single_year_update(tmp_path):
+def test_single_year_update(get_test_file):
     """ Tests that a copyright header's years are updated correctly """
-    shutil.copytree(src=ROOT, dst=Path(tmp_path, 'sample'))
-    baz = Path(tmp_path, 'sample/test/resources/sample/scripts/baz.py')
+    baz = get_test_file('sample/scripts/baz.py')
     copywriter.TxtFile(baz).update()
     with baz.open() as f:
         assert 'Copyright 2019-2020 Bob' in f.read()
 
 
+def test_spaced_year_range_update(get_test_file):
+    """ Tests that a header is updated when the new years are shorter """
+    foo = get_test_file('sample/scripts/foo.py')
+    copywriter.TxtFile(foo, modification_year=2021).update()
+    with foo.open() as f:
+        assert f.read() == '# Copyright 2019-2021 Bob\n'
+
+
 def test_format_detection():
     fmt = copywriter.TxtFile(Path(SAMPLE, 'scripts/baz.py')).format
     assert 'Copyright {year} Bob' == fmt
@@ -127,9 +411,27 @@ def test_auto_header():
     assert auto_header == 'Copyright {year} Bob'
 
 
-def test_c_header_expansion(tmp_path: Path):
+def test_auto_header_is_not_decided_by_first_dir(tmp_path):
+    names = []
+    for owner, dir_, n in (('Google', 'aaa_vendor', 12), ('Bob', 'src', 60)):
+        Path(tmp_path, dir_).mkdir()
+        for i in range(n):
+            names.append(f'{dir_}/{i}.py')
+            Path(tmp_path, names[-1]).write_text(
+                f'# Copyright 2019 {owner}\n'
+            )
+    _commit(tmp_path, *names)
+    assert copywriter.Copywriter(tmp_path).auto_header == (
+        'Copyright {year} Bob'
+    )
+    writer = copywriter.Copywriter(tmp_path)
+    assert not writer.missing
+    assert writer.auto_header == 'Copyright {year} Bob'
+
+
+def test_c_header_expansion(get_test_file):
     """ Tests expansion of a copyright header to a C/C++ source file. """
-    path = _get_test_file(tmp_path, 'missing/existing_doc/c.h')
+    path = get_test_file('missing/existing_doc/c.h')
     expected = textwrap.dedent("""
     /**
      * Copyright 2020 Monty
@@ -149,9 +451,17 @@ def test_c_header_expansion(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_bash_expansion(tmp_path: Path):
+def test_format_with_braces_is_added(tmp_path: Path):
+    path = Path(tmp_path, 'foo.sh')
+    path.write_text('echo foo\n')
+    txt = copywriter.TxtFile(path, modification_year=2020)
+    txt.add('Copyright {year} {Monty}')
+    assert txt.copyright_str == 'Copyright 2020 {Monty}'
+
+
+def test_bash_expansion(get_test_file):
     """ Tests expansion of a copyright header to a bash file. """
-    path = _get_test_file(tmp_path, 'missing/existing_doc/bash.sh')
+    path = get_test_file('missing/existing_doc/bash.sh')
     expected = textwrap.dedent("""
     #
     # Copyright 2020 Monty
@@ -165,11 +475,9 @@ def test_bash_expansion(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_bash_with_shebang_expansion(tmp_path: Path):
+def test_bash_with_shebang_expansion(get_test_file):
     """ Tests expansion of a copyright header to a bash file. """
-    path = _get_test_file(
-        tmp_path, 'missing/existing_doc/bash_with_shebang.sh'
-    )
+    path = get_test_file('missing/existing_doc/bash_with_shebang.sh')
     expected = textwrap.dedent("""
     #!/usr/bin/bash
     #
@@ -184,9 +492,9 @@ def test_bash_with_shebang_expansion(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_cmake_expansion(tmp_path: Path):
+def test_cmake_expansion(get_test_file):
     """ Tests expansion of a copyright header to a cmake file. """
-    path = _get_test_file(tmp_path, 'missing/existing_doc/cmake.cmake')
+    path = get_test_file('missing/existing_doc/cmake.cmake')
     expected = textwrap.dedent("""
     #
     # Copyright 2020 Monty
@@ -202,9 +510,9 @@ def test_cmake_expansion(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_py_expansion(tmp_path: Path):
+def test_py_expansion(get_test_file):
     """ Tests expansion of a copyright header to a cmake file. """
-    path = _get_test_file(tmp_path, 'missing/existing_doc/py.py')
+    path = get_test_file('missing/existing_doc/py.py')
     expected = textwrap.dedent("""
     \"\"\"
     Copyright 2020 Monty
@@ -225,9 +533,9 @@ def test_py_expansion(tmp_path: Path):
     assert content == expected
 
 
-def test_py_with_shebang_expansion(tmp_path: Path):
+def test_py_with_shebang_expansion(get_test_file):
     """ Tests expansion of a copyright header to a cmake file. """
-    path = _get_test_file(tmp_path, 'missing/existing_doc/py_with_shebang.py')
+    path = get_test_file('missing/existing_doc/py_with_shebang.py')
     expected = textwrap.dedent("""
     #!/usr/bin/env/python3
     \"\"\"
@@ -249,9 +557,9 @@ def test_py_with_shebang_expansion(tmp_path: Path):
     assert content == expected
 
 
-def test_c_header_addition(tmp_path: Path):
+def test_c_header_addition(get_test_file):
     """ Tests addition of a copyright header to a C/C++ source file. """
-    path = _get_test_file(tmp_path, 'missing/no_doc/c.h')
+    path = get_test_file('missing/no_doc/c.h')
     expected = textwrap.dedent("""
     /*
      * Copyright 2020 Monty
@@ -271,9 +579,9 @@ def test_c_header_addition(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_bash_addition(tmp_path: Path):
+def test_bash_addition(get_test_file):
     """ Tests addition of a copyright header to a bash file. """
-    path = _get_test_file(tmp_path, 'missing/no_doc/bash.sh')
+    path = get_test_file('missing/no_doc/bash.sh')
     expected = textwrap.dedent("""
     #
     # Copyright 2020 Monty
@@ -285,9 +593,9 @@ def test_bash_addition(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_bash_with_shebang_addition(tmp_path: Path):
+def test_bash_with_shebang_addition(get_test_file):
     """ Tests addition of a copyright header to a bash file. """
-    path = _get_test_file(tmp_path, 'missing/no_doc/bash_with_shebang.sh')
+    path = get_test_file('missing/no_doc/bash_with_shebang.sh')
 
     expected = textwrap.dedent("""
     #!/usr/bin/bash
@@ -302,9 +610,9 @@ def test_bash_with_shebang_addition(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_cmake_addition(tmp_path: Path):
+def test_cmake_addition(get_test_file):
     """ Tests addition of a copyright header to a cmake file. """
-    path = _get_test_file(tmp_path, 'missing/no_doc/cmake.cmake')
+    path = get_test_file('missing/no_doc/cmake.cmake')
     expected = textwrap.dedent("""
     #
     # Copyright 2020 Monty
@@ -317,9 +625,9 @@ def test_cmake_addition(tmp_path: Path):
         assert f.read() == expected
 
 
-def test_py_addition(tmp_path: Path):
+def test_py_addition(get_test_file):
     """ Tests addition of a copyright header to a cmake file. """
-    path = _get_test_file(tmp_path, 'missing/no_doc/py.py')
+    path = get_test_file('missing/no_doc/py.py')
     expected = textwrap.dedent("""
     \"\"\"
     Copyright 2020 Monty
@@ -338,9 +646,9 @@ def test_py_addition(tmp_path: Path):
     assert content == expected
 
 
-def test_py_with_shebang_addition(tmp_path: Path):
+def test_py_with_shebang_addition(get_test_file):
     """ Tests addition of a copyright header to a cmake file. """
-    path = _get_test_file(tmp_path, 'missing/no_doc/py_with_shebang.py')
+    path = get_test_file('missing/no_doc/py_with_shebang.py')
     expected = textwrap.dedent("""
     #!/usr/bin/env/python3
     \"\"\"
@@ -360,18 +668,28 @@ def test_py_with_shebang_addition(tmp_path: Path):
     assert content == expected
 
 
-def test_show_succeeds(tmp_path):
-    test_source_path = Path(tmp_path, 'test_sources')
-    shutil.copytree(src=ROOT, dst=test_source_path)
-    writer = copywriter.Copywriter(test_source_path)
+def test_copyright_str_is_reread_after_addition(get_test_file):
+    path = get_test_file('missing/no_doc/bash.sh')
+    txt = copywriter.TxtFile(path, modification_year=2020)
+    assert txt.copyright_str == ''
+    assert txt.format == ''
+    txt.add('Copyright {year} Monty')
+    assert txt.copyright_str == 'Copyright 2020 Monty'
+    assert txt.format == 'Copyright {year} Monty'
 
 
+def test_show_succeeds(repo_copy):
+    writer = copywriter.Copywriter(repo_copy)
+
+
+@pytest.mark.slow
 def test_update_succeeds(tmp_path):
     test_source_path = Path(tmp_path, 'test_sources')
     shutil.copytree(src=ROOT, dst=test_source_path)
     copywriter.Copywriter(test_source_path).update()
 
 
+@pytest.mark.slow
 def test_add_succeeds(tmp_path):
     test_source_path = Path(tmp_path, 'test_sources')
     shutil.copytree(src=ROOT, dst=test_source_path)
@@ -381,15 +699,49 @@ def test_add_succeeds(tmp_path):
 # Test util.
 
 
-def _get_test_file(tmp_dir: Path, resource: str) -> Path:
+@pytest.fixture(scope='session')
+def repo_copy(tmp_path_factory) -> Path:
     """
-    Copies source to tmp dir and returns path to the moved file.
+    Copies source to a tmp dir shared by all tests.
 
     The complete repo is copied to preserve git info which is
-    needed by copywriter.
+    needed by copywriter, but only once per session.
     """
-    test_source_path = Path(tmp_dir, 'test_sources')
-    shutil.copytree(src=ROOT, dst=test_source_path)
-    relative_path = Path(TEST_RESOURCES, resource).relative_to(ROOT)
-    copied_path = Path(test_source_path, relative_path)
-    return copied_path
+    test_source_path = Path(tmp_path_factory.mktemp('repo'), 'test_sources')
+    shutil.copytree(
+        src=ROOT,
+        dst=test_source_path,
+        ignore=shutil.ignore_patterns('__pycache__', '.pytest_cache'),
+    )
+    return test_source_path
+
+
+@pytest.fixture
+def get_test_file(repo_copy: Path) -> ty.Iterator[ty.Callable[[str], Path]]:
+    """
+    Provides a function returning the path to a resource within the
+    shared copy of the repo.
+
+    Files which were returned are restored from source after the test,
+    so that their modifications are not seen by other tests.
+    """
+    relative_paths = []
+
+    def get(resource: str) -> Path:
+        relative_path = Path(TEST_RESOURCES, resource).relative_to(ROOT)
+        relative_paths.append(relative_path)
+        return Path(repo_copy, relative_path)
+
+    yield get
+    for relative_path in relative_paths:
+        shutil.copy2(Path(ROOT, relative_path), Path(repo_copy, relative_path))
+
+
+def _commit(repo: Path, *name: str) -> None:
+    """
+    Commits the named files to a new git repo.
+    """
+    git = ('git', '-c', 'user.name=Bob', '-c', 'user.email=bob@example.com')
+    subprocess.check_call((*git, 'init', '-q'), cwd=repo)
+    subprocess.check_call((*git, 'add', *name), cwd=repo)
+    subprocess.check_call((*git, 'commit', '-qm', 'Add'), cwd=repo)